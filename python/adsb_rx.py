@@ -7,42 +7,44 @@ Check https://globe.adsbexchange.com for live view of aircraft
 
 import sys
 import time
-import pyModeS
+import re
+import binascii
+from collections import deque
 from pyModeS.streamer.decode import Decode
 
 import serial
 
 latlon = [0.0, 0.0] # Enter your position
 com_ports = ['COM3', 'COM4', 'COM8', 'COM10'] # Set Serial port
+flush_count = 8 # Number of messages accumulated before decoding
+flush_period = 0.2 # Maximum time (in s) before decoding accumulated messages
 
-adsb_msg : list[str] = []
-adsb_ts  : list[float] = []
-commb_msg : list[str] = []
-commb_ts  : list[float] = []
+# Message line sent by the firmware: "<hex message> | -<rssi>dBm"
+msg_re = re.compile(rb'^((?:[0-9a-fA-F]{2})+) \| (-?\d+dBm)\s*$')
 
-def handle_messages(msg: str, t: float): # Check format of messages used in source.py
+# Sliding window of the last 16 messages: oldest entry is dropped on append
+adsb_msg : deque[str] = deque(maxlen=16)
+adsb_ts  : deque[float] = deque(maxlen=16)
+commb_msg : deque[str] = deque(maxlen=16)
+commb_ts  : deque[float] = deque(maxlen=16)
 
-    df = pyModeS.df(msg)
+def handle_messages(msg: str, raw: bytes, t: float): # Check format of messages used in source.py
+
+    # Downlink format is in the 5 MSB of the first byte
+    df = raw[0] >> 3
+    if df not in (17, 18, 20, 21):
+        return
 
     if df == 17 or df == 18:
         adsb_msg.append(msg)
         adsb_ts.append(t)
-        if len(adsb_msg) > 16 :
-            del adsb_msg[0]
-            del adsb_ts[0]
-    elif df == 20 or df == 21:
+    else:
         commb_msg.append(msg)
         commb_ts.append(t)
-        if len(commb_msg) > 16 :
-            del commb_msg[0]
-            del commb_ts[0]
-
-def to_float(s: str) -> float:
-    try:
-        f = float(s)
-        return f
-    except:
-        return 0.0
+
+def to_float(v: float | int | None) -> float:
+    # pyModeS reports unknown fields as None
+    return float(v) if isinstance(v, (int, float)) else 0.0
 
 
 # Get Com port
@@ -61,21 +63,43 @@ if not ser.is_open:
 
 decode = Decode(latlon)
 
+# Messages received since last decode, printed when the batch is flushed
+pending : list[str] = []
+last_flush = time.time()
+# Read with a timeout so that a partial batch still gets flushed
+ser.timeout = flush_period
+partial = b''
+
 while True:
-    line = ser.readline().decode()
-    data = line.strip().split(" | ", 2)
-    if len(data) == 2:
-        msg = data[0]
-        rssi = data[1]
-        handle_messages(msg, time.time())
+    chunk = ser.readline()
+    if not chunk.endswith(b'\n'):
+        # Timeout in the middle of a line: keep it for the next read
+        partial += chunk
+    else:
+        line = partial + chunk
+        partial = b''
+        # Validate the raw line before any decoding: lines corrupted on the UART
+        # are simply displayed
+        m = msg_re.match(line)
+        if m:
+            msg = m[1].decode()
+            handle_messages(msg, binascii.unhexlify(m[1]), time.time())
+            pending.append(f'{msg} | {m[2].decode()}')
+        else :
+            print(f'{line.strip()}')
+
+    # Decode messages by batch: the whole window is processed on each call
+    now = time.time()
+    if pending and (len(pending) >= flush_count or now - last_flush > flush_period):
         decode.process_raw(adsb_ts=adsb_ts, adsb_msg=adsb_msg, commb_ts=commb_ts, commb_msg=commb_msg)
         acs = decode.get_aircraft()
-        print(f'{msg} | {rssi} : ')
+        for p in pending:
+            print(f'{p} : ')
+        pending.clear()
+        last_flush = now
         for k,v in acs.items():
             lat = to_float(v.get('lat', 0.0))
             lon = to_float(v.get('lon', 0.0))
             alt = to_float(v.get('alt', 0))
             callsign = v.get('call', '')
             print(f'  - {callsign} ({k}) : lat = {lat:.4f}, lon = {lon:.4f}, alt = {alt}')
-    else :
-        print(f'{data}')
@@ -3,19 +3,119 @@ import serial
 import re
 import threading
 import math
+import queue
+from dataclasses import dataclass, field
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator
 
 # List of serial ports to try
 COM_PORTS : list[str] = ['COM3', 'COM4', 'COM8', 'COM10']
 
-stop_event = threading.Event()
+# Minimum time between two plot refresh (in s)
+REFRESH_PERIOD : float = 0.1
+# Number of bytes requested for each serial read (~70ms of stream at 576000 baud)
+READ_SIZE : int = 4096
 
-def read_rssi(com_ports: list[str], rssi_dict: dict[float, float], cmd: dict[str,str]):
+# Measurement line sent by the firmware: "<frequency in kHz>:<RSSI in -0.5dB step>"
+RSSI_LINE_RE = re.compile(rb'^(\d+):(\d+)\r?$', re.MULTILINE)
+
+# Set when a command changed the plot configuration since last refresh
+new_data = threading.Event()
+
+@dataclass
+class CommandState:
+	'''User commands shared between the input, reader and plot threads'''
+	stop: bool = False
+	# Commands to send to the board, written by the reader between two reads
+	board_cmds: queue.Queue[str] = field(default_factory=queue.Queue, repr=False, compare=False)
+	min: float = 400 # Sweep start (in MHz)
+	max: float = 1100 # Sweep end (in MHz)
+	step: float = 100 # Sweep step (in kHz)
+	ylim: tuple[float, float] = field(init=False) # RSSI range displayed (in dBm)
+	lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+	def __post_init__(self):
+		self.set_step(self.step)
+
+	def set_step(self, step: float):
+		'''Update the step and the RSSI range around the matching noise floor'''
+		# Noise floor only depends on the step (i.e. the RX bandwidth)
+		f = -174 + 10*math.log10(step*1000)
+		with self.lock:
+			self.step = step
+			self.ylim = (math.floor(f/10)*10-5, math.ceil(f/10+7)*10)
+
+	def get_cfg(self) -> tuple[float, float, float]:
+		'''Return a consistent (min, max, step) triplet'''
+		with self.lock:
+			return (self.min, self.max, self.step)
+
+class Spectrum:
+	'''RSSI measurements stored by frequency bin'''
+
+	def __init__(self, fmin: float, fmax: float, step: float):
+		self.reset(fmin, fmax, step)
+
+	def reset(self, fmin: float, fmax: float, step: float):
+		'''Allocate empty bins from fmin to fmax (in MHz) with a step in kHz'''
+		self.cfg = (fmin, fmax, step)
+		nb_bins = max(1, round((fmax - fmin) * 1e3 / step) + 1)
+		self.freq = fmin + np.arange(nb_bins) * (step / 1e3)
+		self.rssi = np.full(nb_bins, np.nan, dtype=np.float32)
+
+	def add(self, rf: np.ndarray, rssi: np.ndarray):
+		'''Store the RSSI measured at frequencies rf (in kHz)'''
+		fmin, _, step = self.cfg
+		bins = self.rssi
+		idx = np.rint((rf - fmin * 1e3) / step).astype(np.int64)
+		# Ignore measurements outside the current range (e.g. just after a range change)
+		valid = (idx >= 0) & (idx < len(bins))
+		bins[idx[valid]] = rssi[valid]
+
+class SampleRing:
+	'''Single-producer/single-consumer ring buffer of (frequency, RSSI) measurements
+	The producer writes the samples before advancing the write count, so the
+	consumer only ever reads complete samples and no lock is needed'''
+
+	def __init__(self, size: int):
+		self.rf = np.zeros(size, dtype=np.int64)
+		self.rssi = np.zeros(size, dtype=np.float32)
+		self.head = 0 # Number of samples written since start
+		self.tail = 0 # Number of samples read since start
+
+	def __len__(self) -> int:
+		return self.head - self.tail
+
+	def push(self, rf: np.ndarray, rssi: np.ndarray):
+		'''Write a block of samples (producer side)'''
+		size = len(self.rf)
+		n = min(len(rf), size)
+		idx = (self.head + np.arange(n)) % size
+		self.rf[idx] = rf[-n:]
+		self.rssi[idx] = rssi[-n:]
+		self.head += n
+
+	def pop(self) -> tuple[np.ndarray, np.ndarray]:
+		'''Read all samples written since last call (consumer side)'''
+		head = self.head
+		# Oldest samples are lost when the consumer is too slow
+		tail = max(self.tail, head - len(self.rf))
+		idx = np.arange(tail, head) % len(self.rf)
+		self.tail = head
+		return self.rf[idx], self.rssi[idx]
+
+def parse_block(block: bytes) -> tuple[np.ndarray, np.ndarray]:
+	'''Parse all measurement lines in a block, returning frequencies (kHz) and RSSI (dBm)
+	Lines corrupted by the UART do not match and are simply skipped'''
+	vals = np.array(RSSI_LINE_RE.findall(block), dtype=np.int64).reshape(-1, 2)
+	return vals[:,0], vals[:,1] * -0.5
+
+def read_rssi(com_ports: list[str], samples: SampleRing, cmd: CommandState):
 	ser = serial.Serial()
 	# ser.baudrate = 115200
 	ser.baudrate = 576000
-	while not ser.is_open:
+	while not ser.is_open and not cmd.stop:
 		for port in com_ports :
 			try :
 				ser.port = port
@@ -28,67 +128,69 @@ def read_rssi(com_ports: list[str], rssi_dict: dict[float, float], cmd: dict[str
 			print(f'No valid port found, retrying in 5s ...')
 			time.sleep(5)
 		else :
-			# cnt = 0
-			while not stop_event.is_set() and ser.is_open:
+			# Read with a timeout to check regularly for stop/command
+			ser.timeout = 0.1
+			buf = bytearray()
+			while not cmd.stop and ser.is_open:
 				try:
-					line = ser.readline().decode()
-					data = line.split(':')
-					# cnt += 1
-					# if cnt > 100:
-					# 	print(f'{line}', end='')
-					# 	cnt = 0
-					if len(data)==2:
-							rf = float(data[0]) / 1e3
-							rssi = -float(data[1]) / 2.0
-							rssi_dict[rf] = rssi
-					if 'stop' in cmd.keys():
-						return
-					elif 'cmd' in cmd.keys():
-						_n = ser.write(cmd['cmd'].encode())
-						# print(f'[Serial] Wrote {_n} bytes : {cmd["cmd"]}')
-						del cmd['cmd']
+					# Wait for a full chunk (or the timeout): the GIL is released while
+					# waiting, and the block is then parsed in a single pass
+					buf += ser.read(max(READ_SIZE, ser.in_waiting))
+					# Handle all complete lines, keeping the partial one for next read
+					end = buf.rfind(b'\n')
+					if end >= 0:
+						samples.push(*parse_block(bytes(buf[:end])))
+						del buf[:end+1]
+					while not cmd.board_cmds.empty():
+						board_cmd = cmd.board_cmds.get_nowait()
+						_n = ser.write(board_cmd.encode())
+						# print(f'[Serial] Wrote {_n} bytes : {board_cmd}')
 
 				# On serial error, consider it closed
 				except serial.SerialException:
 					ser.is_open = False
-				# Ignore other error (likely float conversion failing due to uart)
-				except:
-					continue
 
-def get_input(rssi_dict: dict[float, float], cmd_dict: dict[str,str]):
+def get_input(cmd: CommandState):
 	plot_en = True
 	while plot_en:
-		cmd = input()
-		if cmd in ('exit','stop', 'done') :
-			cmd_dict['stop'] = 'now'
+		line = input()
+		if line in ('exit','stop', 'done') :
+			cmd.stop = True
 			plot_en = False
 		else :
-			cmd_dict['cmd'] = cmd
-			if cmd.lower().startswith('r') :
-				cmd_split = re.split(r' |:|-', cmd[1:])
-				if len(cmd_split)==2:
-					cmd_dict['min'] = cmd_split[0]
-					cmd_dict['max'] = cmd_split[1]
-			elif cmd.lower().startswith('s') :
-				cmd_dict['step'] = cmd[1:]
-				# Clear dictionnary when step changed
-				rssi_dict.clear()
-			# print(cmd_dict)
+			cmd.board_cmds.put(line)
+			# Values are sent as-is to the board, but only valid ones update the plot
+			try:
+				if line.lower().startswith('r') :
+					cmd_split = re.split(r' |:|-', line[1:])
+					if len(cmd_split)==2:
+						fmin = float(cmd_split[0])
+						fmax = float(cmd_split[1])
+						with cmd.lock:
+							cmd.min = fmin
+							cmd.max = fmax
+				elif line.lower().startswith('s') :
+					step = float(line[1:])
+					if step > 0:
+						cmd.set_step(step)
+			except ValueError:
+				pass
+			new_data.set()
+			# print(cmd)
 
 
 if __name__ == '__main__':
-	rssi_dict : dict[float, float] = {}
-	cmd_dict : dict[str,str] = {}
-
-	cmd_dict['min'] = '400'
-	cmd_dict['max'] = '1100'
-	cmd_dict['step'] = '100'
+	# Measurements written by the reader thread and consumed by the plot (~10s of stream).
+	# Only the main thread touches the spectrum, so it can be resized without lock
+	samples = SampleRing(1 << 16)
+	cmd = CommandState()
+	spectrum = Spectrum(*cmd.get_cfg())
 
 	# Thread to read and plot
-	read_thread = threading.Thread(target=read_rssi, args=(COM_PORTS, rssi_dict, cmd_dict))
+	read_thread = threading.Thread(target=read_rssi, args=(COM_PORTS, samples, cmd))
 	read_thread.start()
 
-	input_thread = threading.Thread(target=get_input, args=(rssi_dict, cmd_dict))
+	input_thread = threading.Thread(target=get_input, args=(cmd,))
 	input_thread.start()
 
 
@@ -96,47 +198,72 @@ if __name__ == '__main__':
 	if fig.canvas.manager is not None:
 		fig.canvas.manager.set_window_title('RSSI vs Freq.')
 
+	# Points and axes decoration are created once and only updated in the loop.
+	# A marker-only line is used instead of a scatter: all markers share the
+	# same size/color and are rendered in a single draw call
+	pts_line, = ax.plot([], [], marker='o', markersize=1.5, linestyle='None', animated=True)
+	ax.yaxis.set_major_locator(MultipleLocator(10))
+	ax.yaxis.set_minor_locator(MultipleLocator(2))
+	ax.set_xlabel('Frequency (MHz)')
+	ax.set_ylabel('RSSI (dBm)')
+	ax.grid(True, which='major', axis='both')
+	ax.grid(True, which='minor', axis='both', linestyle=':')
+
+	# Blitting: the static part of the axes is captured after each full draw
+	# (startup, resize, configuration change) and only the points are redrawn on refresh
+	background = None
+	def on_draw(_event):
+		global background
+		background = fig.canvas.copy_from_bbox(ax.bbox)
+		ax.draw_artist(pts_line)
+	fig.canvas.mpl_connect('draw_event', on_draw)
+	plt.show(block=False)
+
+	prev_cfg = None
+	last_draw = time.monotonic()
+	# Force a first refresh to configure the axes
+	new_data.set()
 	while True:
-		if 'stop' in cmd_dict.keys() :
+		if cmd.stop :
 			read_thread.join()
 			break
-		ax.clear()
-		freqs = list(rssi_dict.keys())
-		rssi = list(rssi_dict.values())
-		nb_val = min(len(freqs),len(rssi))
-		if nb_val > 1 :
-			ax.scatter(freqs[:nb_val], rssi[:nb_val], s=2)
-			try:
-				xmin = float(cmd_dict['min'])
-				xmax = float(cmd_dict['max'])
-				xstep = float(cmd_dict['step'])
-			except:
-				xmin = 400
-				xmax = 1100
-				xstep = 100
-			delta = xmax - xmin
-			if delta > 200:
-				loc = (100,10)
-			elif delta > 40:
-				loc = (10,2)
-			elif delta > 10:
-				loc = (2,0.5)
-			else :
-				loc = (1,0.1)
-			ax.set_xlim(xmin,xmax)
-			ax.xaxis.set_major_locator(MultipleLocator(loc[0]))
-			ax.xaxis.set_minor_locator(MultipleLocator(loc[1]))
-			ax.yaxis.set_major_locator(MultipleLocator(10))
-			ax.yaxis.set_minor_locator(MultipleLocator(2))
-			ax.set_xlabel('Frequency (MHz)')
-			f = -174 + 10*math.log10(xstep*1000)
-			ax.set_ylim(math.floor(f/10)*10-5, math.ceil(f/10+7)*10)
-			ax.set_ylabel('RSSI (dBm)')
-			ax.grid(True, which='major', axis='both')
-			ax.grid(True, which='minor', axis='both', linestyle=':')
+		# Redraw at a limited rate and only when something changed
+		now = time.monotonic()
+		if (samples or new_data.is_set()) and now - last_draw > REFRESH_PERIOD:
+			new_data.clear()
+			last_draw = now
+			# Clear measurements and update axes only when the range or step changed
+			cfg = cmd.get_cfg()
+			full_draw = cfg != prev_cfg or background is None
+			if cfg != prev_cfg:
+				prev_cfg = cfg
+				xmin, xmax, xstep = cfg
+				if cfg != spectrum.cfg:
+					spectrum.reset(xmin, xmax, xstep)
+				delta = xmax - xmin
+				if delta > 200:
+					loc = (100,10)
+				elif delta > 40:
+					loc = (10,2)
+				elif delta > 10:
+					loc = (2,0.5)
+				else :
+					loc = (1,0.1)
+				ax.set_xlim(xmin,xmax)
+				ax.xaxis.set_major_locator(MultipleLocator(loc[0]))
+				ax.xaxis.set_minor_locator(MultipleLocator(loc[1]))
+				ax.set_ylim(*cmd.ylim)
+			spectrum.add(*samples.pop())
+			# Empty bins are NaN and are simply not drawn
+			pts_line.set_data(spectrum.freq, spectrum.rssi)
+			if full_draw:
+				fig.canvas.draw_idle()
+			else:
+				fig.canvas.restore_region(background)
+				ax.draw_artist(pts_line)
+				fig.canvas.blit(ax.bbox)
 		try:
-			plt.pause(0.05)
+			fig.canvas.flush_events()
+			time.sleep(0.01)
 		except:
 			continue
-
-